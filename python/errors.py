@@ -0,0 +1,3 @@
+class CDOError(Exception):
+    """Custom exception for CDO API errors"""
+    pass
@@ -1,11 +1,25 @@
-import requests
-import time
 import argparse
-from typing import Dict, Optional
+import csv
+import functools
+import logging
+import sys
+from typing import Dict, List
+from python.errors import CDOError
+from python.json_compat import dumps, loads
 
-class CDOError(Exception):
-    """Custom exception for CDO API errors"""
-    pass
+# requests, urllib3 and the modules built on them are imported where they are used,
+# so parsing arguments and printing --help stays fast
+
+DEFAULT_DELAY = 1.0
+# Fixed delay between attempts before --max-wall-seconds, used to convert --max-attempts
+LEGACY_ATTEMPT_DELAY = 10.0
+
+def __getattr__(name: str):
+    """Re-export poll_transaction_status lazily, keeping python.ftd.poll_transaction_status importable"""
+    if name == 'poll_transaction_status':
+        from python.poll_service import poll_transaction_status
+        return poll_transaction_status
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def initiate_ftd_onboarding_using_ztp(
     base_url: str,
@@ -37,8 +51,10 @@ def initiate_ftd_onboarding_using_ztp(
         CDOError: If the API request fails or returns an error status
         requests.exceptions.RequestException: For network-related errors
     """
+    from python.session import REQUEST_TIMEOUT, SESSION, bearer_auth
+    
     headers = {
-        'Authorization': f'Bearer {token}',
+        'Authorization': bearer_auth(token),
         'Content-Type': 'application/json'
     }
     
@@ -50,16 +66,17 @@ def initiate_ftd_onboarding_using_ztp(
         'adminPassword': admin_password
     }
     
-    response = requests.post(
+    response = SESSION.post(
         f'{base_url}/api/rest/v1/inventory/devices/ftds/ztp',
         headers=headers,
-        json=payload
+        data=dumps(payload),
+        timeout=REQUEST_TIMEOUT
     )
     
     if response.status_code != 202:
         raise CDOError(f'Failed to create ZTP request: {response.text}')
         
-    return response.json()
+    return loads(response.content)
 
 def delete_ftd_device(
     base_url: str,
@@ -77,22 +94,26 @@ def delete_ftd_device(
     Returns:
         Dict containing the API response with transaction details for monitoring the deletion process
     """
+    from python.session import REQUEST_TIMEOUT, SESSION, bearer_auth
+    
     headers = {
-        'Authorization': f'Bearer {token}'
+        'Authorization': bearer_auth(token)
     }
     
-    response = requests.post(
+    response = SESSION.post(
         f'{base_url}/api/rest/v1/inventory/devices/ftds/cdfmcManaged/{device_uuid}/delete',
-        headers=headers
+        headers=headers,
+        timeout=REQUEST_TIMEOUT
     )
     
     if response.status_code != 202:
         raise CDOError(f'Failed to delete FTD device: {response.text}')
         
-    return response.json()
+    return loads(response.content)
 
-def parse_arguments():
-    """Parse command line arguments"""
+@functools.lru_cache(maxsize=None)
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command line argument parser"""
     parser = argparse.ArgumentParser(description='Manage FTD devices in CDO')
     
     # Create subparsers for different operations
@@ -100,10 +121,11 @@ def parse_arguments():
     
     # Onboard command
     onboard_parser = subparsers.add_parser('onboard', help='Onboard an FTD device using ZTP')
-    onboard_parser.add_argument('--device-name', required=True, help='Name of the device')
-    onboard_parser.add_argument('--serial-number', required=True, help='Serial number of the device')
-    onboard_parser.add_argument('--policy-uuid', required=True, help='UUID of the access policy')
+    onboard_parser.add_argument('--device-name', required=False, help='Name of the device')
+    onboard_parser.add_argument('--serial-number', required=False, help='Serial number of the device')
+    onboard_parser.add_argument('--policy-uuid', required=False, help='UUID of the access policy')
     onboard_parser.add_argument('--admin-password', required=False, default='', help='Admin password for the device. Ignore if password is already set on device.')
+    onboard_parser.add_argument('--batch', required=False, help='CSV file with device_name,serial_number,policy_uuid[,admin_password] rows to onboard concurrently')
     
     # Delete command
     delete_parser = subparsers.add_parser('delete', help='Delete an FTD device')
@@ -117,57 +139,203 @@ def parse_arguments():
         p.add_argument('--token',
                       required=True,
                       help='Bearer token for authentication')
+        p.add_argument('--max-wall-seconds',
+                      type=float,
+                      default=3000.0,
+                      help='Maximum total time to poll for in seconds (default: 3000)')
         p.add_argument('--max-attempts',
                       type=int,
-                      default=300,
-                      help='Maximum number of polling attempts (default: 300)')
+                      default=None,
+                      help='Deprecated: use --max-wall-seconds. Polls for max-attempts * delay seconds, with a delay of 10 unless given')
         p.add_argument('--delay',
-                      type=int,
-                      default=10,
-                      help='Delay between polling attempts in seconds (default: 10)')
+                      type=float,
+                      default=None,
+                      help='Initial delay between polling attempts in seconds (default: 1)')
+        p.add_argument('--max-delay',
+                      type=float,
+                      default=30.0,
+                      help='Maximum delay between polling attempts in seconds (default: 30)')
+        p.add_argument('--long-poll-timeout',
+                      type=float,
+                      default=30.0,
+                      help='Seconds to ask the server to hold each poll request, 0 to disable (default: 30)')
+        p.add_argument('--quiet',
+                      action='store_true',
+                      help='Suppress per-attempt polling output')
     
-    return parser.parse_args()
+    return parser
 
-def poll_transaction_status(
-    polling_url: str,
-    token: str,
-    max_attempts: int = 300,
-    delay_seconds: int = 10
-) -> Optional[Dict]:
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = build_parser()
+    args = parser.parse_args()
+    
+    if args.operation == 'onboard' and not args.batch:
+        missing = [
+            option for option, value in [
+                ('--device-name', args.device_name),
+                ('--serial-number', args.serial_number),
+                ('--policy-uuid', args.policy_uuid)
+            ] if not value
+        ]
+        if missing:
+            parser.error(f"the following arguments are required for onboard: {', '.join(missing)}")
+    
+    if args.operation and args.max_attempts is not None:
+        # Attempts used to be spaced by --delay, which defaulted to 10s
+        attempt_delay = LEGACY_ATTEMPT_DELAY if args.delay is None else args.delay
+        args.max_wall_seconds = args.max_attempts * attempt_delay
+        print(
+            f"Warning: --max-attempts is deprecated, polling for up to {args.max_wall_seconds:g}s. "
+            "Use --max-wall-seconds instead.",
+            file=sys.stderr
+        )
+    
+    if args.operation and args.delay is None:
+        args.delay = DEFAULT_DELAY
+    
+    return args
+
+class ProgressHandler(logging.StreamHandler):
     """
-    Poll the transaction status until it reaches a final state.
+    Logging handler that keeps per-attempt polling progress on a single line.
     
-    Args:
-        polling_url: The URL to poll for status
-        token: Bearer token for authentication
-        max_attempts: Maximum number of polling attempts
-        delay_seconds: Delay between polling attempts in seconds
-        
-    Returns:
-        Dict containing the final API response or None if timeout
+    Progress records, which carry the transaction status in a cdo_status attribute
+    (passed with extra={'cdo_status': ...}), redraw the current line on a terminal
+    and are only flushed when the status changes or every flush_every records. When
+    the stream is not a terminal, only status changes are written, so CI logs get one
+    line per state instead of one per attempt. All other records are written on
+    their own line as usual.
     """
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
     
-    for attempt in range(max_attempts):
-        response = requests.get(polling_url, headers=headers)
+    def __init__(self, stream=None, flush_every: int = 10):
+        super().__init__(stream or sys.stdout)
+        self.flush_every = flush_every
+        self._is_tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self._count = 0
+        self._last_status = None
+        self._on_progress_line = False
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        if not hasattr(record, 'cdo_status'):
+            self.end_progress_line()
+            super().emit(record)
+            return
         
-        if response.status_code not in [200, 202]:
-            raise CDOError(f'Failed to poll status: {response.text} code: {response.status_code}')
+        try:
+            status = record.cdo_status
+            changed = status != self._last_status
+            self._last_status = status
+            self._count += 1
+            
+            if not self._is_tty:
+                if changed:
+                    super().emit(record)
+                return
             
-        status_data = response.json()
-        current_status = status_data.get('cdoTransactionStatus')
+            self.stream.write(f"\r{self.format(record)}\033[K")
+            self._on_progress_line = True
+            if changed or self._count % self.flush_every == 0:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+    
+    def close(self) -> None:
+        self.end_progress_line()
+        super().close()
+    
+    def end_progress_line(self) -> None:
+        """Move past the progress line so the next output starts on a fresh line"""
+        if self._on_progress_line:
+            self.stream.write(self.terminator)
+            self.flush()
+            self._on_progress_line = False
+
+BATCH_COLUMNS = ('device_name', 'serial_number', 'policy_uuid', 'admin_password')
+BATCH_REQUIRED_COLUMNS = ('device_name', 'serial_number', 'policy_uuid')
+
+def read_batch_file(path: str) -> List[Dict]:
+    """
+    Read devices to onboard from a CSV file.
+    
+    The first row is taken as a header when every cell in it is a known column
+    name, in which case the columns may come in any order. Otherwise the columns
+    are device_name, serial_number, policy_uuid and an optional admin_password.
+    
+    Args:
+        path: Path to the CSV file, one device per row
         
-        print(f"Current status: {current_status} (Attempt {attempt + 1}/{max_attempts})")
+    Returns:
+        List of dicts keyed by column name
         
-        if current_status in ['DONE', 'ERROR']:
-            return status_data
+    Raises:
+        CDOError: If the header or any row is missing a required column, so nothing
+            is sent for a partly invalid file
+    """
+    columns = list(BATCH_COLUMNS)
+    devices = []
+    first_row = True
+    
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            
+            if first_row:
+                first_row = False
+                header = [cell.strip() for cell in row]
+                if set(header) <= set(BATCH_COLUMNS):
+                    missing = [column for column in BATCH_REQUIRED_COLUMNS if column not in header]
+                    if missing:
+                        raise CDOError(f"{path}: header is missing columns: {', '.join(missing)}")
+                    columns = header
+                    continue
+            
+            if len(row) > len(columns):
+                raise CDOError(f'{path}:{reader.line_num}: expected at most {len(columns)} columns, got {len(row)}')
             
-        time.sleep(delay_seconds)
+            device = dict(zip(columns, row))
+            missing = [column for column in BATCH_REQUIRED_COLUMNS if not device.get(column, '').strip()]
+            if missing:
+                raise CDOError(f"{path}:{reader.line_num}: missing {', '.join(missing)}")
+            devices.append(device)
     
-    return None
+    if not devices:
+        raise CDOError(f'{path}: no devices to onboard')
+    return devices
+
+def onboard_batch(args) -> None:
+    """Onboard every device in the batch file concurrently and report each result"""
+    # Imported here so httpx is only required for batch onboarding
+    import asyncio
+    from python.poll_service_async import onboard_batch as onboard_batch_async
+    
+    devices = read_batch_file(args.batch)
+    print(f"Initiating FTD onboarding for {len(devices)} devices...")
+    results = asyncio.run(onboard_batch_async(
+        args.url,
+        args.token,
+        devices,
+        max_wall_seconds=args.max_wall_seconds,
+        initial_delay=args.delay,
+        max_delay=args.max_delay,
+        long_poll_timeout=args.long_poll_timeout
+    ))
+    
+    failed = False
+    for device, result in zip(devices, results):
+        if isinstance(result, Exception):
+            failed = True
+            print(f"{device['device_name']}: Error: {result}")
+        elif result is None:
+            failed = True
+            print(f"{device['device_name']}: Polling timed out")
+        else:
+            print(f"{device['device_name']}: Final status: {result}")
+    
+    if failed:
+        exit(1)
 
 def main():
     args = parse_arguments()
@@ -176,9 +344,29 @@ def main():
         print("Error: No operation specified. Use --help for usage information.")
         exit(1)
     
+    # Per-attempt progress is logged at DEBUG by the polling modules
+    logging.basicConfig(format='%(message)s')
+    logging.getLogger('python').setLevel(logging.INFO if args.quiet else logging.DEBUG)
+    
+    # Concurrent batch progress interleaves devices, so it cannot share one line
+    progress_handler = None
+    if not getattr(args, 'batch', None):
+        progress_handler = ProgressHandler(sys.stdout)
+        progress_handler.setFormatter(logging.Formatter('%(message)s'))
+        poll_logger = logging.getLogger('python.poll_service')
+        poll_logger.addHandler(progress_handler)
+        poll_logger.propagate = False
+    
+    import requests
+    import urllib3
+    from python.poll_service import poll_transaction_status
+    
     try:
         # Execute requested operation
-        if args.operation == 'onboard':
+        if args.operation == 'onboard' and args.batch:
+            onboard_batch(args)
+            return
+        elif args.operation == 'onboard':
             print("Initiating FTD onboarding...")
             response = initiate_ftd_onboarding_using_ztp(
                 args.url,
@@ -204,12 +392,19 @@ def main():
             raise CDOError("No polling URL in response")
             
         print("\nStarting status polling...")
-        final_status = poll_transaction_status(
-            polling_url, 
-            args.token,
-            args.max_attempts,
-            args.delay
-        )
+        try:
+            final_status = poll_transaction_status(
+                polling_url, 
+                args.token,
+                args.max_wall_seconds,
+                args.delay,
+                args.max_delay,
+                long_poll_timeout=args.long_poll_timeout,
+                base_url=args.url
+            )
+        finally:
+            if progress_handler is not None:
+                progress_handler.end_progress_line()
         
         if final_status is None:
             print("Polling timed out")
@@ -219,7 +414,7 @@ def main():
     except CDOError as e:
         print(f"Error: {e}")
         exit(1)
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
         print(f"Network error: {e}")
         exit(1)
     except Exception as e:
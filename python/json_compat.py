@@ -0,0 +1,23 @@
+from typing import Any
+
+# orjson parses and serializes in C; fall back to the stdlib when it is not installed
+try:
+    import orjson
+
+    def loads(data: bytes) -> Any:
+        """Deserialize a JSON document"""
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to a UTF-8 encoded JSON document"""
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+
+    def loads(data: bytes) -> Any:
+        """Deserialize a JSON document"""
+        return json.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to a UTF-8 encoded JSON document"""
+        return json.dumps(obj).encode('utf-8')
@@ -1,45 +1,475 @@
-import requests
+import logging
+import random
+import re
+import threading
 import time
-from typing import Dict, Optional
-from python.ftd import CDOError
+import urllib3
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+from python.errors import CDOError
+from python.json_compat import loads
+from python.session import REQUEST_TIMEOUT, bearer_auth, poll_pool
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = frozenset({'DONE', 'ERROR', 'CANCELED', 'TIMEOUT'})
+POLL_OK_STATUSES = frozenset({200, 202})
+TRANSIENT_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+# A long-poll response returning faster than this fraction of the requested wait,
+# without a state change, means the server ignored the Prefer header
+LONG_POLL_MIN_WAIT_FRACTION = 0.1
+
+# Cheap peek at the status so pending responses need not be fully parsed
+_STATUS_KEY = b'"cdoTransactionStatus"'
+_STATUS_PATTERN = re.compile(re.escape(_STATUS_KEY) + rb'\s*:\s*"([A-Z_]+)"')
+
+# Draws from os.urandom so processes forked from one parent do not share a sequence
+_SYSTEM_RANDOM = random.SystemRandom()
+
+# Recent non-terminal responses keyed by (polling URL, token), as (fetched_at, status_data).
+# The token is part of the key so a response is only reused for the credentials that fetched it
+_STATUS_CACHE: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
+_STATUS_CACHE_LOCK = threading.Lock()
+
+def get_cached_status(polling_url: str, token: str, ttl_ms: int, newer_than: Optional[float] = None) -> Optional[Tuple[float, Dict]]:
+    """
+    Return (fetched_at, status_data) cached for polling_url and token if it was
+    fetched within ttl_ms and, when newer_than is given, after that time
+    """
+    with _STATUS_CACHE_LOCK:
+        entry = _STATUS_CACHE.get((polling_url, token))
+    if entry is None or time.monotonic() - entry[0] >= ttl_ms / 1000:
+        return None
+    if newer_than is not None and entry[0] <= newer_than:
+        return None
+    return entry
+
+def cache_status(polling_url: str, token: str, status_data: Dict) -> float:
+    """Cache status_data for polling_url and token and return the time the response arrived"""
+    fetched_at = time.monotonic()
+    with _STATUS_CACHE_LOCK:
+        _STATUS_CACHE[(polling_url, token)] = (fetched_at, status_data)
+    return fetched_at
+
+def invalidate_cached_status(polling_url: str, token: str) -> None:
+    """Drop any cached status for polling_url and token"""
+    with _STATUS_CACHE_LOCK:
+        _STATUS_CACHE.pop((polling_url, token), None)
+
+def initial_jitter(initial_jitter_seconds: Optional[float], initial_delay: float) -> float:
+    """
+    Pick the random delay before the first poll so callers started together do not
+    poll in lockstep.
+    
+    Args:
+        initial_jitter_seconds: Upper bound on the delay, or None for min(2, 0.3 * initial_delay)
+        initial_delay: Delay before the second polling attempt in seconds
+        
+    Returns:
+        Seconds to wait before the first request
+    """
+    if initial_jitter_seconds is None:
+        initial_jitter_seconds = min(2.0, initial_delay * 0.3)
+    if initial_jitter_seconds <= 0:
+        return 0.0
+    return _SYSTEM_RANDOM.uniform(0, initial_jitter_seconds)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value into a number of seconds to wait.
+    
+    Args:
+        value: The raw header value, either delay-seconds or an HTTP-date
+        
+    Returns:
+        Seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    
+    value = value.strip()
+    # str.isdigit() also accepts non-ASCII digits such as '²', which float() rejects
+    if value.isascii() and value.isdigit():
+        return float(value)
+    
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def parse_status_response(body: bytes) -> Dict:
+    """
+    Parse a transaction status response, fully decoding it only when needed.
+    
+    Args:
+        body: The raw JSON response body
+        
+    Returns:
+        Dict containing only cdoTransactionStatus for pending transactions, or the
+        full decoded response for terminal ones or if the status cannot be found
+        unambiguously
+    """
+    # Nested detail objects may carry their own status, so the peek is only
+    # trusted when the key appears exactly once in the body
+    if body.count(_STATUS_KEY) != 1:
+        return loads(body)
+    
+    match = _STATUS_PATTERN.search(body)
+    if match is not None:
+        status = match.group(1).decode('ascii')
+        if status not in TERMINAL_STATES:
+            return {'cdoTransactionStatus': status}
+    return loads(body)
+
+def validate_polling_url(polling_url: str, base_url: Optional[str] = None) -> None:
+    """
+    Check that a polling URL returned by the API is safe to send credentials to.
+    
+    Args:
+        polling_url: The URL to poll for status
+        base_url: The base URL for the CDO DevNet API. If given, the polling URL host
+            must be the base URL host or one of its subdomains
+        
+    Raises:
+        CDOError: If the polling URL is not HTTPS or points at an unexpected host
+    """
+    parsed = urlparse(polling_url)
+    if parsed.scheme != 'https' or not parsed.hostname:
+        raise CDOError(f'Refusing to poll non-HTTPS URL: {polling_url}')
+    
+    if base_url is None:
+        return
+    
+    allowed_host = urlparse(base_url).hostname
+    host = parsed.hostname
+    if host != allowed_host and not host.endswith(f'.{allowed_host}'):
+        raise CDOError(f'Refusing to poll URL outside {allowed_host}: {polling_url}')
+
+class PollSchedule:
+    """
+    Decides how long to wait between polls of one transaction.
+    
+    Holds the deadline, backoff, transient-error streak and long-poll state so the
+    sync and async pollers share one policy and differ only in how they do I/O.
+    Each method returns the number of seconds to sleep, already capped at the
+    deadline.
+    """
+    
+    def __init__(
+        self,
+        max_wall_seconds: float,
+        initial_delay: float,
+        max_delay: float,
+        factor: float,
+        jitter: float,
+        error_base_delay: float,
+        max_error_delay: float,
+        long_poll_timeout: float,
+        max_connection_errors: int = 5
+    ):
+        self.deadline = time.monotonic() + max_wall_seconds
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.error_base_delay = error_base_delay
+        self.max_error_delay = max_error_delay
+        self.long_poll_timeout = long_poll_timeout
+        self.max_connection_errors = max_connection_errors
+        self.long_polling = long_poll_timeout > 0
+        self.attempt = 0
+        # Only regular pending polls advance the backoff, not retries, cache hits or long polls
+        self._backoff_step = 0
+        self._error_streak = 0
+        self._connection_error_streak = 0
+        self._previous_status = None
+        self._requested_at = 0.0
+        self._requested_wait = None
+    
+    def remaining(self) -> float:
+        """Seconds left until the deadline"""
+        return max(0.0, self.deadline - time.monotonic())
+    
+    def expired(self) -> bool:
+        """Whether the deadline has passed"""
+        return time.monotonic() >= self.deadline
+    
+    def capped(self, seconds: float) -> float:
+        """Limit a sleep so it never extends past the deadline"""
+        return max(0.0, min(seconds, self.remaining()))
+    
+    def can_request(self) -> bool:
+        """
+        Whether there is time left for another request. A long poll needs at least
+        a second, the smallest wait the Prefer header can ask for.
+        """
+        remaining = self.remaining()
+        return remaining >= 1 if self.long_polling else remaining > 0
+    
+    def request_timeout(self, seconds: float) -> float:
+        """Limit a connect or read timeout so the request never runs past the deadline"""
+        # A zero socket timeout would make the request non-blocking rather than fail fast
+        return max(0.01, min(seconds, self.remaining()))
+    
+    def start_request(self) -> Optional[int]:
+        """
+        Record that a request is about to be sent.
+        
+        Returns:
+            Seconds to ask the server to hold the request with Prefer: wait, or None
+            when not long polling. Never more than the time left before the deadline.
+        """
+        self._requested_at = time.monotonic()
+        if self.long_polling:
+            self._requested_wait = max(1, int(min(self.long_poll_timeout, self.remaining())))
+        else:
+            self._requested_wait = None
+        return self._requested_wait
+    
+    def after_transient_error(self, retry_after: Optional[float], connection_error: Optional[str] = None) -> float:
+        """
+        Pick the sleep after a connection error, timeout or transient HTTP status.
+        
+        Args:
+            retry_after: Seconds from the response's Retry-After header, which takes
+                precedence over the doubling error backoff
+            connection_error: Description of the error when no response was received
+            
+        Raises:
+            CDOError: After max_connection_errors consecutive failures without a
+                response, e.g. DNS failures or an unreachable host
+        """
+        self._error_streak += 1
+        if connection_error is None:
+            self._connection_error_streak = 0
+        else:
+            self._connection_error_streak += 1
+            if self._connection_error_streak >= self.max_connection_errors:
+                raise CDOError(
+                    f'Giving up after {self._connection_error_streak} consecutive connection errors: {connection_error}'
+                )
+        if retry_after is None:
+            retry_after = min(self.max_error_delay, self.error_base_delay * 2 ** self._error_streak) * random.uniform(0.5, 1.5)
+        return self.capped(retry_after)
+    
+    def after_pending(self, status: Optional[str], retry_after: Optional[float], from_cache: bool = False) -> float:
+        """
+        Pick the sleep after a non-terminal status.
+        
+        While long polling, the next request is sent at once unless the server
+        answered well before the requested wait without a status change, in which
+        case long polling is switched off for the rest of the schedule.
+        
+        Args:
+            status: The transaction status that was returned
+            retry_after: Seconds from the response's Retry-After header; the sleep is
+                at least this long
+            from_cache: Whether the status came from the cache rather than a request
+        """
+        if not from_cache:
+            self._error_streak = 0
+            self._connection_error_streak = 0
+        
+        if self.long_polling and not from_cache:
+            returned_early = time.monotonic() - self._requested_at < self._requested_wait * LONG_POLL_MIN_WAIT_FRACTION
+            if not returned_early or status != self._previous_status:
+                self._previous_status = status
+                return self.capped(retry_after) if retry_after is not None else 0.0
+            self.long_polling = False
+        
+        delay = min(self.max_delay, self.initial_delay * self.factor ** self._backoff_step)
+        if not from_cache:
+            self._backoff_step += 1
+        sleep = random.uniform(delay * (1 - self.jitter), delay * (1 + self.jitter))
+        if retry_after is not None:
+            sleep = max(sleep, retry_after)
+        return self.capped(sleep)
 
 def poll_transaction_status(
     polling_url: str,
     token: str,
-    max_attempts: int = 300,
-    delay_seconds: int = 10
+    max_wall_seconds: float = 3000.0,
+    initial_delay: float = 1.0,
+    max_delay: float = 30.0,
+    factor: float = 2.0,
+    jitter: float = 0.3,
+    error_base_delay: float = 1.0,
+    max_error_delay: float = 60.0,
+    long_poll_timeout: float = 30.0,
+    ttl_ms: int = 0,
+    base_url: Optional[str] = None,
+    initial_jitter_seconds: Optional[float] = None,
+    max_connection_errors: int = 5
 ) -> Optional[Dict]:
     """
     Poll the transaction status until it reaches a final state.
     
+    Polling stops after max_wall_seconds regardless of how the delays below add up,
+    and no sleep, request or long-poll wait extends past that deadline.
+    
+    The delay between attempts grows exponentially from initial_delay up to
+    max_delay, with random jitter applied so quick transitions are caught early
+    while long-running transactions are polled less often.
+    
+    Transient failures (connection errors, timeouts and HTTP 429/502/503/504) are
+    retried with a separate backoff that doubles on each consecutive failure up to
+    max_error_delay and resets on the next successful response. Polling gives up
+    after max_connection_errors consecutive failures without any response. A Retry-After
+    header on a transient failure takes precedence over the computed backoff, and
+    one on a pending response extends the next delay to at least that long.
+    
+    When long_poll_timeout is positive, each request asks the server to hold the
+    response until the status changes (Prefer: wait=N) and the next request is
+    sent immediately. If the server answers well before the requested wait without
+    a status change, it is assumed not to support long polling and the regular
+    backoff between attempts is used instead.
+    
+    When ttl_ms is positive, a non-terminal response fetched for the same polling
+    URL and token within the last ttl_ms milliseconds by another caller watching
+    the same transaction is reused instead of issuing a new request. Each cached
+    response is used at most once, and never by the caller that fetched it.
+    Terminal responses are never cached.
+    
     Args:
         polling_url: The URL to poll for status
         token: Bearer token for authentication
-        max_attempts: Maximum number of polling attempts
-        delay_seconds: Delay between polling attempts in seconds
+        max_wall_seconds: Maximum total time to poll for in seconds
+        initial_delay: Delay before the second polling attempt in seconds
+        max_delay: Upper bound on the delay between polling attempts in seconds
+        factor: Multiplier applied to the delay after each attempt
+        jitter: Fraction of the delay to randomize by in either direction
+        error_base_delay: Base delay after a transient failure in seconds
+        max_error_delay: Upper bound on the delay after transient failures in seconds
+        long_poll_timeout: Seconds to ask the server to hold each request, 0 to disable
+        ttl_ms: Milliseconds a cached response may be reused, 0 to disable and invalidate
+        base_url: The base URL for the CDO DevNet API, used to restrict the polling host
+        initial_jitter_seconds: Upper bound on the random delay before the first request,
+            defaults to min(2, 0.3 * initial_delay)
+        max_connection_errors: Consecutive failures without a response before giving up
         
     Returns:
         Dict containing the final API response or None if timeout
+        
+    Raises:
+        CDOError: If the polling URL is rejected, the API returns a non-transient error
+            status or the API cannot be reached
     """
+    validate_polling_url(polling_url, base_url)
+    http = poll_pool(polling_url)
+    
     headers = {
-        'Authorization': f'Bearer {token}',
+        'Authorization': bearer_auth(token),
         'Content-Type': 'application/json'
     }
     
-    for attempt in range(max_attempts):
-        response = requests.get(polling_url, headers=headers)
+    schedule = PollSchedule(
+        max_wall_seconds,
+        initial_delay,
+        max_delay,
+        factor,
+        jitter,
+        error_base_delay,
+        max_error_delay,
+        long_poll_timeout,
+        max_connection_errors
+    )
+    time.sleep(schedule.capped(initial_jitter(initial_jitter_seconds, initial_delay)))
+    
+    request_timeout = None
+    timeout_key = None
+    debug = logger.isEnabledFor(logging.DEBUG)
+    
+    if ttl_ms <= 0:
+        invalidate_cached_status(polling_url, token)
+    
+    # Arrival time of the newest response this call fetched or took from the cache,
+    # so only responses other callers fetched since then are reused
+    seen_at = None
+    
+    while schedule.can_request():
+        schedule.attempt += 1
+        cached = get_cached_status(polling_url, token, ttl_ms, seen_at) if ttl_ms > 0 else None
+        from_cache = cached is not None
+        if from_cache:
+            seen_at, status_data = cached
+        retry_after = None
         
-        if response.status_code not in [200, 202]:
-            raise CDOError(f'Failed to poll status: {response.text} code: {response.status_code}')
+        if not from_cache:
+            wait = schedule.start_request()
+            if wait is None:
+                headers.pop('Prefer', None)
+                read = REQUEST_TIMEOUT[1]
+            else:
+                headers['Prefer'] = f'wait={wait}'
+                read = wait + 5
+            # Rebuilt only when the wait changes or the deadline starts cutting it short
+            key = (wait, schedule.request_timeout(REQUEST_TIMEOUT[0]), schedule.request_timeout(read))
+            if key != timeout_key:
+                request_timeout = urllib3.Timeout(connect=key[1], read=key[2])
+                timeout_key = key
+            
+            try:
+                response = http.request(
+                    'GET',
+                    polling_url,
+                    headers=headers,
+                    timeout=request_timeout,
+                    redirect=False
+                )
+            except (
+                urllib3.exceptions.NewConnectionError,
+                urllib3.exceptions.ProtocolError,
+                urllib3.exceptions.TimeoutError
+            ) as e:
+                if schedule.expired():
+                    break
+                response = None
+                error = str(e)
+            
+            if response is None or response.status in TRANSIENT_STATUS_CODES:
+                if response is not None:
+                    error = f'code: {response.status}'
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                sleep = schedule.after_transient_error(retry_after, error if response is None else None)
+                logger.warning("Transient polling error (%s), retrying in %.1fs (Attempt %d)", error, sleep, schedule.attempt)
+                time.sleep(sleep)
+                continue
             
-        status_data = response.json()
+            if response.status not in POLL_OK_STATUSES:
+                raise CDOError(f"Failed to poll status: {response.data.decode('utf-8', 'replace')} code: {response.status}")
+            
+            status_data = parse_status_response(response.data)
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                logger.info("Server requested Retry-After of %.1fs", retry_after)
+        
         current_status = status_data.get('cdoTransactionStatus')
         
-        print(f"Current status: {current_status} (Attempt {attempt + 1}/{max_attempts})")
+        if debug:
+            logger.debug(
+                "Current status: %s (Attempt %d, %.0fs remaining)",
+                current_status, schedule.attempt, schedule.remaining(),
+                extra={'cdo_status': current_status}
+            )
         
-        if current_status in ['DONE', 'ERROR']:
+        if current_status in TERMINAL_STATES:
+            invalidate_cached_status(polling_url, token)
             return status_data
-            
-        time.sleep(delay_seconds)
+        
+        if ttl_ms > 0 and not from_cache:
+            seen_at = cache_status(polling_url, token, status_data)
+        
+        long_polling = schedule.long_polling
+        sleep = schedule.after_pending(current_status, retry_after, from_cache)
+        if long_polling and not schedule.long_polling:
+            logger.info("Server does not appear to support long polling, falling back to regular polling")
+        time.sleep(sleep)
     
     return None
@@ -0,0 +1,323 @@
+import asyncio
+import httpx
+import logging
+from typing import Dict, List, Optional
+from python.errors import CDOError
+from python.json_compat import dumps, loads
+from python.poll_service import (
+    POLL_OK_STATUSES,
+    TERMINAL_STATES,
+    TRANSIENT_STATUS_CODES,
+    PollSchedule,
+    cache_status,
+    get_cached_status,
+    initial_jitter,
+    invalidate_cached_status,
+    parse_retry_after,
+    parse_status_response,
+    validate_polling_url
+)
+from python.session import bearer_auth
+
+logger = logging.getLogger(__name__)
+
+# 5s to connect and 30s for every other phase of CDO API requests
+REQUEST_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+def create_client() -> httpx.AsyncClient:
+    """Create an HTTP/2 client so concurrent polls are multiplexed over shared connections"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=20),
+        http2=True,
+        timeout=REQUEST_TIMEOUT
+    )
+
+async def initiate_ftd_onboarding_using_ztp(
+    client: httpx.AsyncClient,
+    base_url: str,
+    token: str,
+    device_name: str,
+    serial_number: str,
+    access_policy_uuid: str,
+    admin_password: str = ''
+) -> Dict:
+    """
+    Asynchronous version of python.ftd.initiate_ftd_onboarding_using_ztp.
+
+    Args:
+        client: The shared async HTTP client
+        base_url: The base URL for the CDO DevNet API
+        token: Bearer token for API authentication
+        device_name: Name to assign to the FTD device in cdFMC
+        serial_number: Serial number of the physical FTD device
+        access_policy_uuid: UUID of the access control policy to be applied to the device
+        admin_password: Admin password for the device
+
+    Returns:
+        Dict containing the API response with transaction details for monitoring the onboarding process
+
+    Raises:
+        CDOError: If the API request fails or returns an error status
+    """
+    headers = {
+        'Authorization': bearer_auth(token),
+        'Content-Type': 'application/json'
+    }
+
+    payload = {
+        'name': device_name,
+        'serialNumber': serial_number,
+        'fmcAccessPolicyUid': access_policy_uuid,
+        'licenses': ['BASE'],
+        'adminPassword': admin_password
+    }
+
+    response = await client.post(
+        f'{base_url}/api/rest/v1/inventory/devices/ftds/ztp',
+        headers=headers,
+        content=dumps(payload)
+    )
+
+    if response.status_code != 202:
+        raise CDOError(f'Failed to create ZTP request: {response.text}')
+
+    return loads(response.content)
+
+async def poll_transaction_status(
+    client: httpx.AsyncClient,
+    polling_url: str,
+    token: str,
+    max_wall_seconds: float = 3000.0,
+    initial_delay: float = 1.0,
+    max_delay: float = 30.0,
+    factor: float = 2.0,
+    jitter: float = 0.3,
+    error_base_delay: float = 1.0,
+    max_error_delay: float = 60.0,
+    long_poll_timeout: float = 30.0,
+    ttl_ms: int = 0,
+    base_url: Optional[str] = None,
+    initial_jitter_seconds: Optional[float] = None,
+    max_connection_errors: int = 5,
+    device_name: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    Asynchronous version of python.poll_service.poll_transaction_status.
+
+    Uses the same PollSchedule and status cache as the sync poller, but waits with
+    asyncio.sleep so many transactions can be polled concurrently with
+    asyncio.gather over a single shared client. Every log record is prefixed with
+    device_name, or the polling URL when no device name is given, so output from
+    concurrent transactions can be told apart.
+
+    Args:
+        client: The shared async HTTP client
+        polling_url: The URL to poll for status
+        token: Bearer token for authentication
+        max_wall_seconds: Maximum total time to poll for in seconds
+        initial_delay: Delay before the second polling attempt in seconds
+        max_delay: Upper bound on the delay between polling attempts in seconds
+        factor: Multiplier applied to the delay after each attempt
+        jitter: Fraction of the delay to randomize by in either direction
+        error_base_delay: Base delay after a transient failure in seconds
+        max_error_delay: Upper bound on the delay after transient failures in seconds
+        long_poll_timeout: Seconds to ask the server to hold each request, 0 to disable
+        ttl_ms: Milliseconds a cached response may be reused, 0 to disable and invalidate
+        base_url: The base URL for the CDO DevNet API, used to restrict the polling host
+        initial_jitter_seconds: Upper bound on the random delay before the first request,
+            defaults to min(2, 0.3 * initial_delay)
+        max_connection_errors: Consecutive failures without a response before giving up
+        device_name: Name identifying the transaction in log output
+
+    Returns:
+        Dict containing the final API response or None if timeout
+
+    Raises:
+        CDOError: If the polling URL is rejected, the API returns a non-transient error
+            status or the API cannot be reached
+    """
+    validate_polling_url(polling_url, base_url)
+    label = device_name or polling_url
+
+    headers = {
+        'Authorization': bearer_auth(token),
+        'Content-Type': 'application/json'
+    }
+
+    schedule = PollSchedule(
+        max_wall_seconds,
+        initial_delay,
+        max_delay,
+        factor,
+        jitter,
+        error_base_delay,
+        max_error_delay,
+        long_poll_timeout,
+        max_connection_errors
+    )
+    await asyncio.sleep(schedule.capped(initial_jitter(initial_jitter_seconds, initial_delay)))
+
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    if ttl_ms <= 0:
+        invalidate_cached_status(polling_url, token)
+
+    # Arrival time of the newest response this call fetched or took from the cache,
+    # so only responses other callers fetched since then are reused
+    seen_at = None
+
+    while schedule.can_request():
+        schedule.attempt += 1
+        cached = get_cached_status(polling_url, token, ttl_ms, seen_at) if ttl_ms > 0 else None
+        from_cache = cached is not None
+        if from_cache:
+            seen_at, status_data = cached
+        retry_after = None
+
+        if not from_cache:
+            wait = schedule.start_request()
+            if wait is None:
+                headers.pop('Prefer', None)
+                read = REQUEST_TIMEOUT.read
+            else:
+                headers['Prefer'] = f'wait={wait}'
+                read = wait + 5
+            request_timeout = httpx.Timeout(
+                schedule.request_timeout(read),
+                connect=schedule.request_timeout(REQUEST_TIMEOUT.connect)
+            )
+
+            try:
+                response = await client.get(polling_url, headers=headers, timeout=request_timeout)
+            except httpx.TransportError as e:
+                if schedule.expired():
+                    break
+                response = None
+                error = str(e)
+
+            if response is None or response.status_code in TRANSIENT_STATUS_CODES:
+                if response is not None:
+                    error = f'code: {response.status_code}'
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                sleep = schedule.after_transient_error(retry_after, error if response is None else None)
+                logger.warning("%s: Transient polling error (%s), retrying in %.1fs (Attempt %d)", label, error, sleep, schedule.attempt)
+                await asyncio.sleep(sleep)
+                continue
+
+            if response.status_code not in POLL_OK_STATUSES:
+                raise CDOError(f'Failed to poll status for {label}: {response.text} code: {response.status_code}')
+
+            status_data = parse_status_response(response.content)
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                logger.info("%s: Server requested Retry-After of %.1fs", label, retry_after)
+
+        current_status = status_data.get('cdoTransactionStatus')
+
+        if debug:
+            logger.debug(
+                "%s: Current status: %s (Attempt %d, %.0fs remaining)",
+                label, current_status, schedule.attempt, schedule.remaining(),
+                extra={'cdo_status': current_status}
+            )
+
+        if current_status in TERMINAL_STATES:
+            invalidate_cached_status(polling_url, token)
+            return status_data
+
+        if ttl_ms > 0 and not from_cache:
+            seen_at = cache_status(polling_url, token, status_data)
+
+        long_polling = schedule.long_polling
+        sleep = schedule.after_pending(current_status, retry_after, from_cache)
+        if long_polling and not schedule.long_polling:
+            logger.info("%s: Server does not appear to support long polling, falling back to regular polling", label)
+        await asyncio.sleep(sleep)
+
+    return None
+
+async def onboard_and_poll(
+    client: httpx.AsyncClient,
+    base_url: str,
+    token: str,
+    device_name: str,
+    serial_number: str,
+    access_policy_uuid: str,
+    admin_password: str = '',
+    **poll_kwargs
+) -> Optional[Dict]:
+    """
+    Onboard a single FTD device using ZTP and poll its transaction to completion.
+
+    Args:
+        client: The shared async HTTP client
+        base_url: The base URL for the CDO DevNet API
+        token: Bearer token for API authentication
+        device_name: Name to assign to the FTD device in cdFMC
+        serial_number: Serial number of the physical FTD device
+        access_policy_uuid: UUID of the access control policy to be applied to the device
+        admin_password: Admin password for the device
+        poll_kwargs: Additional arguments passed to poll_transaction_status
+
+    Returns:
+        Dict containing the final API response or None if timeout
+    """
+    response = await initiate_ftd_onboarding_using_ztp(
+        client,
+        base_url,
+        token,
+        device_name,
+        serial_number,
+        access_policy_uuid,
+        admin_password
+    )
+
+    polling_url = response.get('transactionPollingUrl')
+    if not polling_url:
+        raise CDOError(f"No polling URL in response for {device_name}")
+
+    return await poll_transaction_status(
+        client,
+        polling_url,
+        token,
+        base_url=base_url,
+        device_name=device_name,
+        **poll_kwargs
+    )
+
+async def onboard_batch(
+    base_url: str,
+    token: str,
+    devices: List[Dict],
+    **poll_kwargs
+) -> List:
+    """
+    Onboard several FTD devices concurrently over one shared client.
+
+    Args:
+        base_url: The base URL for the CDO DevNet API
+        token: Bearer token for API authentication
+        devices: List of dicts with device_name, serial_number, policy_uuid and
+            optionally admin_password
+        poll_kwargs: Additional arguments passed to poll_transaction_status
+
+    Returns:
+        List with the final status, None on timeout, or the raised exception for each device
+    """
+    async with create_client() as client:
+        return await asyncio.gather(
+            *[
+                onboard_and_poll(
+                    client,
+                    base_url,
+                    token,
+                    device['device_name'],
+                    device['serial_number'],
+                    device['policy_uuid'],
+                    device.get('admin_password') or '',
+                    **poll_kwargs
+                )
+                for device in devices
+            ],
+            return_exceptions=True
+        )
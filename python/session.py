@@ -0,0 +1,94 @@
+import functools
+import os
+import requests
+import threading
+import urllib3
+from requests.adapters import HTTPAdapter
+from requests.utils import (
+    DEFAULT_CA_BUNDLE_PATH,
+    extract_zipped_paths,
+    get_auth_from_url,
+    get_environ_proxies,
+    select_proxy
+)
+from typing import Dict, Optional, Tuple
+from urllib3.util.retry import Retry
+
+# (connect, read) timeout in seconds for CDO API requests
+REQUEST_TIMEOUT = (5, 30)
+
+def _create_session() -> requests.Session:
+    """Create a session that pools and reuses HTTPS connections to the CDO API"""
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False
+    )
+    session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries))
+    return session
+
+# Shared by every requests-based CDO API call
+SESSION = _create_session()
+
+# Lower-overhead urllib3 pools for the status polling loop, keyed by (proxy URL, CA bundle)
+_POLL_POOLS: Dict[Tuple[Optional[str], str], urllib3.PoolManager] = {}
+_POLL_POOLS_LOCK = threading.Lock()
+
+def _ca_bundle() -> str:
+    """Return the CA bundle requests would verify against, honoring REQUESTS_CA_BUNDLE and CURL_CA_BUNDLE"""
+    return (
+        os.environ.get('REQUESTS_CA_BUNDLE')
+        or os.environ.get('CURL_CA_BUNDLE')
+        or extract_zipped_paths(DEFAULT_CA_BUNDLE_PATH)
+    )
+
+def poll_pool(url: str) -> urllib3.PoolManager:
+    """
+    Return a urllib3 pool for polling url with the same proxy and CA settings requests
+    would use for it, so polls work wherever the requests-based POSTs do.
+    
+    Proxies come from the environment (HTTPS_PROXY, NO_PROXY and friends) and the CA
+    bundle from REQUESTS_CA_BUNDLE or CURL_CA_BUNDLE, falling back to certifi. The
+    pool does not retry; the poll loop handles its own retries.
+    
+    Args:
+        url: The URL that will be polled
+        
+    Returns:
+        A PoolManager, or a ProxyManager when url should go through a proxy
+    """
+    proxy = select_proxy(url, get_environ_proxies(url))
+    ca_bundle = _ca_bundle()
+    
+    with _POLL_POOLS_LOCK:
+        pool = _POLL_POOLS.get((proxy, ca_bundle))
+        if pool is not None:
+            return pool
+        
+        pool_kwargs = {
+            'maxsize': 8,
+            'retries': False,
+            'timeout': urllib3.Timeout(connect=REQUEST_TIMEOUT[0], read=REQUEST_TIMEOUT[1]),
+            'cert_reqs': 'CERT_REQUIRED'
+        }
+        if os.path.isdir(ca_bundle):
+            pool_kwargs['ca_cert_dir'] = ca_bundle
+        else:
+            pool_kwargs['ca_certs'] = ca_bundle
+        
+        if proxy:
+            username, password = get_auth_from_url(proxy)
+            proxy_headers = urllib3.make_headers(proxy_basic_auth=f'{username}:{password}') if username else None
+            pool = urllib3.ProxyManager(proxy, proxy_headers=proxy_headers, **pool_kwargs)
+        else:
+            pool = urllib3.PoolManager(**pool_kwargs)
+        
+        _POLL_POOLS[(proxy, ca_bundle)] = pool
+        return pool
+
+@functools.lru_cache(maxsize=8)
+def bearer_auth(token: str) -> str:
+    """Build the Authorization header value for a CDO API token"""
+    return f'Bearer {token}'